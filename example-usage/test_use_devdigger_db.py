@@ -0,0 +1,445 @@
+"""Checks for use_devdigger_db.py against temp databases with the app's schema"""
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import use_devdigger_db as dd
+from use_devdigger_db import DevDiggerDB
+
+
+# Tables as created by DatabaseService.createTables() in src/main/services/database.ts
+APP_SCHEMA = """
+    CREATE TABLE sources (
+        id TEXT PRIMARY KEY, type TEXT, url TEXT UNIQUE, title TEXT,
+        description TEXT, metadata JSON, crawl_status TEXT DEFAULT 'pending',
+        last_crawled TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE documents (
+        id TEXT PRIMARY KEY, source_id TEXT NOT NULL, content TEXT NOT NULL,
+        content_hash TEXT UNIQUE, chunk_index INTEGER, metadata JSON,
+        embedding BLOB, embedding_model TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE code_examples (
+        id TEXT PRIMARY KEY, document_id TEXT NOT NULL, source_id TEXT NOT NULL,
+        language TEXT, code TEXT NOT NULL, description TEXT, tags JSON,
+        usage_count INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE collections (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE settings (
+        key TEXT PRIMARY KEY, value TEXT, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE VIRTUAL TABLE documents_fts USING fts5(
+        id UNINDEXED, content, title, url, tokenize='porter unicode61'
+    );
+    INSERT INTO sources (id, type, url, title) VALUES ('s1', 'website', 'https://example.com', 'word5 site');
+"""
+
+
+def make_db(path, n=10, dim=8, seed=0):
+    """Create an app-style database with n embedded documents; return their vectors"""
+    conn = sqlite3.connect(path)
+    conn.executescript(APP_SCHEMA)
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    for i, vec in enumerate(vectors):
+        add_document(conn, f"doc{i}", f"word{i} text", vec)
+    conn.commit()
+    conn.close()
+    return vectors
+
+
+def add_document(conn, doc_id, content, vec=None):
+    """Insert a document the way DatabaseService.addDocument does"""
+    conn.execute("""
+        INSERT OR REPLACE INTO documents (id, source_id, content, content_hash, chunk_index, embedding)
+        VALUES (?, 's1', ?, ?, 0, ?)
+    """, (doc_id, content, doc_id, None if vec is None else np.asarray(vec, np.float32).tobytes()))
+
+
+def app_rebuild_fts(conn):
+    """EnhancedDatabaseService.rebuildFTSIndex(): rows get fresh rowids"""
+    conn.execute("DELETE FROM documents_fts")
+    conn.execute("""
+        INSERT OR REPLACE INTO documents_fts (id, content, title, url)
+        SELECT d.id, d.content, s.title, s.url
+        FROM documents d LEFT JOIN sources s ON d.source_id = s.id
+    """)
+    conn.commit()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "devdigger.db"
+    make_db(path)
+    return path
+
+
+def test_search_after_app_rebuild_returns_matching_content(db_path):
+    DevDiggerDB(db_path).close()
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM documents WHERE id = 'doc2'")
+    conn.commit()
+    app_rebuild_fts(conn)
+
+    with DevDiggerDB(db_path, read_only=True) as db:
+        results = db.search("word5")
+    assert [(r['id'], r['content']) for r in results] == [('doc5', 'word5 text')]
+
+
+def test_search_ignores_duplicate_fts_rows_and_title(db_path):
+    DevDiggerDB(db_path).close()
+    conn = sqlite3.connect(db_path)
+    # addDocumentWithFTS: the app indexes its own inserts
+    add_document(conn, "new", "zebra text")
+    conn.execute("INSERT INTO documents_fts (id, content, title, url) VALUES ('new', 'zebra text', '', '')")
+    conn.commit()
+
+    with DevDiggerDB(db_path) as db:
+        assert [r['id'] for r in db.search("zebra")] == ['new']
+        # The source title contains word5, only doc5's content does
+        assert [r['id'] for r in db.search("word5")] == ['doc5']
+        count = db.conn.execute("SELECT COUNT(*) FROM documents_fts").fetchone()[0]
+    assert count == 11
+
+
+def test_embeddings_file_is_per_database(tmp_path):
+    vectors_a = make_db(tmp_path / "A.db", n=10, seed=1)
+    make_db(tmp_path / "B.db", n=30, seed=2)
+    DevDiggerDB(tmp_path / "A.db").close()
+    DevDiggerDB(tmp_path / "B.db").close()
+
+    for read_only in (True, False):
+        with DevDiggerDB(tmp_path / "A.db", read_only=read_only) as db:
+            ids, scores = db.similarity_search(vectors_a[3], top_k=1)
+        assert ids[0] == 'doc3'
+        assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_foreign_embeddings_file_is_ignored(tmp_path):
+    vectors_a = make_db(tmp_path / "A.db", n=10, seed=1)
+    make_db(tmp_path / "B.db", n=30, seed=2)
+    DevDiggerDB(tmp_path / "A.db").close()
+    DevDiggerDB(tmp_path / "B.db").close()
+    (tmp_path / "B.embeddings.f32").replace(tmp_path / "A.embeddings.f32")
+
+    with DevDiggerDB(tmp_path / "A.db", read_only=True) as db:
+        ids, _ = db.similarity_search(vectors_a[3], top_k=1)
+    assert ids[0] == 'doc3'
+
+
+def test_read_only_open_sees_documents_added_by_the_app(db_path):
+    DevDiggerDB(db_path).close()
+    query = np.ones(8, dtype=np.float32)
+    conn = sqlite3.connect(db_path)
+    add_document(conn, "late", "late text", query)
+    add_document(conn, "doc4", "word4 text", -query)  # re-embedded by the app
+    conn.commit()
+
+    with DevDiggerDB(db_path, read_only=True) as db:
+        ids, scores = db.similarity_search(query, top_k=1)
+        batch_ids = np.concatenate([ids for ids, _, _ in db.iter_embedding_batches(batch_size=4)])
+    assert ids[0] == 'late'
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert sorted(batch_ids) == sorted([f"doc{i}" for i in range(10)] + ['late'])
+
+
+def test_embeddings_file_is_compacted(db_path, monkeypatch):
+    monkeypatch.setattr(dd, 'EMBEDDING_FILE_COMPACT_MIN_SLOTS', 4)
+    DevDiggerDB(db_path).close()
+    path = db_path.with_suffix('.embeddings.f32')
+    conn = sqlite3.connect(db_path)
+    for _ in range(3):
+        for i in range(10):
+            add_document(conn, f"doc{i}", f"word{i} text", np.full(8, i + 1.0))
+        conn.commit()
+        DevDiggerDB(db_path).close()
+
+    assert path.stat().st_size <= dd.EMBEDDING_FILE_HEADER_SIZE + 2 * 10 * 8 * 4
+    with DevDiggerDB(db_path) as db:
+        ids, _ = db.similarity_search(np.full(8, 3.0), top_k=10)
+    assert sorted(ids) == sorted(f"doc{i}" for i in range(10))
+
+
+def test_mixed_dimensions_only_search_matching_vectors(db_path):
+    conn = sqlite3.connect(db_path)
+    short = np.array([1, -1, 1, 1], dtype=np.float32)
+    add_document(conn, "short", "short text", short)
+    conn.commit()
+
+    with DevDiggerDB(db_path) as db:
+        ids, _ = db.similarity_search(short, top_k=3)
+        assert list(ids) == ['short']
+        dims = {matrix.shape[1] for _, matrix, _ in db.iter_embedding_batches(batch_size=4)}
+    assert dims == {8}
+
+
+def test_binary_search_only_searches_matching_dimension(db_path):
+    conn = sqlite3.connect(db_path)
+    short = np.array([1, -1, 1, 1], dtype=np.float32)
+    add_document(conn, "short", "short text", short)
+    conn.commit()
+
+    with DevDiggerDB(db_path) as db:
+        ids, _ = db.binary_search(short, top_k=3)
+        assert list(ids) == ['short']
+        ids, _ = db.binary_search(np.ones(8), top_k=3)
+    assert 'short' not in ids and len(ids) == 3
+
+
+def test_topk_batch_rejects_wrong_dimension():
+    matrix = np.ones((5, 8), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+    with pytest.raises(ValueError):
+        dd._topk_batch(matrix, np.ones(4, dtype=np.float32), norms, 3)
+
+
+def test_topk_batch_numba_matches_numpy(monkeypatch):
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(3)
+    matrix = rng.standard_normal((3000, 16)).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+    q = rng.standard_normal(16).astype(np.float32)
+
+    idx, scores = dd._topk_batch(matrix, q, norms, 10)
+    monkeypatch.setattr(dd, 'njit', None)
+    ref_idx, ref_scores = dd._topk_batch(matrix, q, norms, 10)
+
+    order, ref_order = np.argsort(-scores), np.argsort(-ref_scores)
+    assert list(idx[order]) == list(ref_idx[ref_order])
+    np.testing.assert_allclose(scores[order], ref_scores[ref_order], rtol=1e-5)
+
+
+def test_mapped_scan_reads_only_the_covering_index(db_path):
+    DevDiggerDB(db_path).close()
+    with DevDiggerDB(db_path, read_only=True) as db:
+        plan = db.conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT embedding_offset, embedding_norm, id FROM documents
+            WHERE embedding_offset BETWEEN 0 AND 9
+            ORDER BY embedding_offset
+        """).fetchall()
+    assert 'COVERING INDEX idx_documents_embedding_slots' in plan[0]['detail']
+
+
+def test_binary_search_finds_documents_added_by_the_app(db_path):
+    DevDiggerDB(db_path).close()
+    query = np.ones(8, dtype=np.float32)
+    conn = sqlite3.connect(db_path)
+    add_document(conn, "late", "late text", query)
+    conn.commit()
+
+    with DevDiggerDB(db_path, read_only=True) as db:
+        ids, scores = db.binary_search(query, top_k=1)
+    assert ids[0] == 'late'
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_binary_search_zero_query_scores_zero(db_path):
+    with DevDiggerDB(db_path) as db:
+        _, scores = db.binary_search(np.zeros(8), top_k=3)
+    assert len(scores) == 3 and not np.isnan(scores).any()
+    assert (scores == 0).all()
+
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_topk_batch_zero_query_scores_zero(monkeypatch, use_numba):
+    if use_numba:
+        pytest.importorskip('numba')
+    else:
+        monkeypatch.setattr(dd, 'njit', None)
+    matrix = np.ones((5, 8), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+    _, scores = dd._topk_batch(matrix, np.zeros(8, dtype=np.float32), norms, 3)
+    assert list(scores) == [0, 0, 0]
+
+
+def test_semantic_search_finds_exact_match(tmp_path):
+    pytest.importorskip('faiss')
+    vectors = make_db(tmp_path / "devdigger.db")
+    with DevDiggerDB(tmp_path / "devdigger.db") as db:
+        ids, scores = db.semantic_search(vectors[3], top_k=3)
+        with pytest.raises(ValueError):
+            db.semantic_search(np.ones(4), top_k=3)
+    assert ids[0] == 'doc3' and len(ids) == 3
+    assert scores[0] == pytest.approx(1.0, abs=0.05)
+
+
+def test_saved_faiss_index_is_rebuilt_when_documents_change(db_path):
+    pytest.importorskip('faiss')
+    with DevDiggerDB(db_path) as db:
+        db.build_faiss_index(quantized=False)
+    query = np.ones(8, dtype=np.float32)
+    conn = sqlite3.connect(db_path)
+    add_document(conn, "late", "late text", query)
+    conn.commit()
+
+    for read_only in (True, False):
+        with DevDiggerDB(db_path, read_only=read_only) as db:
+            ids, _ = db.semantic_search(query, top_k=1)
+        assert ids[0] == 'late'
+
+
+def test_read_only_faiss_index_stays_in_memory(db_path):
+    pytest.importorskip('faiss')
+    DevDiggerDB(db_path).close()
+    with DevDiggerDB(db_path, read_only=True) as db:
+        ids, _ = db.semantic_search(np.ones(8), top_k=1)
+    assert len(ids) == 1
+    assert not db_path.with_suffix('.faiss').exists()
+    assert not db_path.with_suffix('.faiss.ids.npy').exists()
+
+
+def test_close_twice(db_path):
+    with DevDiggerDB(db_path) as db:
+        db.close()
+    db.close()
+    assert db.conn is None
+
+
+class _FailingPragmas:
+    """Connection stand-in whose statements fail, e.g. on a locked database"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+    def close(self):
+        self.conn.close()
+
+
+def test_close_survives_failing_pragmas(db_path):
+    with pytest.raises(KeyError):
+        with DevDiggerDB(db_path) as db:
+            conn = db.conn
+            db.conn = _FailingPragmas(conn)
+            raise KeyError("original error")
+    assert db.conn is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_int8_batches_match_quantize_embedding(db_path):
+    DevDiggerDB(db_path).close()
+    late = np.linspace(-1, 1, 8).astype(np.float32)
+    conn = sqlite3.connect(db_path)
+    add_document(conn, "late", "late text", late)
+    conn.commit()
+
+    with DevDiggerDB(db_path, read_only=True) as db:
+        batches = list(db.iter_embedding_batches(batch_size=4, dtype=np.int8))
+        stored = {row['id']: row['embedding'] for row in db.get_embeddings()}
+    for ids, matrix, norms in batches:
+        assert matrix.dtype == np.int8
+        for doc_id, row, norm in zip(ids, matrix, norms):
+            vec = np.asarray(stored[doc_id])
+            assert row.tobytes() == dd.quantize_embedding(vec)
+            assert norm == pytest.approx(np.linalg.norm(vec), rel=1e-5)
+    assert sum(len(ids) for ids, _, _ in batches) == 11
+
+
+def test_integer_dtypes_other_than_int8_are_rejected(db_path):
+    with DevDiggerDB(db_path) as db:
+        with pytest.raises(ValueError):
+            next(db.iter_embedding_batches(dtype=np.int16))
+
+
+def test_read_only_search_finds_documents_added_by_the_app(db_path):
+    DevDiggerDB(db_path).close()
+    conn = sqlite3.connect(db_path)
+    add_document(conn, "late", "late text")
+    conn.commit()
+
+    with DevDiggerDB(db_path, read_only=True) as db:
+        assert [r['id'] for r in db.search("late")] == ['late']
+
+
+def test_quantize_round_trip():
+    vec = np.random.default_rng(4).standard_normal(64).astype(np.float32)
+    vec /= np.linalg.norm(vec)
+    blob = dd.quantize_embedding(vec)
+    assert len(blob) == 64
+    np.testing.assert_allclose(dd.dequantize_embedding(blob), vec, atol=0.008)
+    np.testing.assert_array_equal(dd.dequantize_embedding(np.frombuffer(blob, dtype=np.int8)),
+                                  dd.dequantize_embedding(blob))
+
+
+def test_get_embeddings_quantized(db_path):
+    # Quantization assumes unit-norm vectors, like the app's embedding models produce
+    vectors = np.random.default_rng(5).standard_normal((5, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    conn = sqlite3.connect(db_path)
+    for i, vec in enumerate(vectors):
+        add_document(conn, f"unit{i}", f"unit{i} text", vec)
+    conn.commit()
+
+    with DevDiggerDB(db_path) as db:
+        quantized = {row['id']: row['embedding'] for row in db.get_embeddings(quantized=True)}
+    assert len(quantized) == 15
+    for i, vec in enumerate(vectors):
+        assert quantized[f"unit{i}"].dtype == np.int8
+        np.testing.assert_allclose(dd.dequantize_embedding(quantized[f"unit{i}"]), vec, atol=0.008)
+
+
+def test_export_to_json(db_path, tmp_path):
+    with DevDiggerDB(db_path) as db:
+        path = db.export_to_json(tmp_path / "export.json")
+    with open(path) as f:
+        data = json.load(f)
+    assert list(data) == ['sources', 'documents', 'code_examples']
+    assert [row['url'] for row in data['sources']] == ['https://example.com']
+    assert sorted(row['id'] for row in data['documents']) == sorted(f"doc{i}" for i in range(10))
+    assert 'embedding' not in data['documents'][0]
+    assert data['code_examples'] == []
+
+
+def test_export_to_jsonl_round_trip(db_path, tmp_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT INTO code_examples (id, document_id, source_id, language, code)
+        VALUES ('c1', 'doc1', 's1', 'python', 'print(1)')
+    """)
+    conn.commit()
+
+    with DevDiggerDB(db_path) as db:
+        path = db.export_to_jsonl(tmp_path / "export.jsonl", embeddings_dir=tmp_path / "vectors")
+        vectors = {row['id']: row['embedding'] for row in db.get_embeddings()}
+    rows = list(dd.iter_export(path))
+    assert [table for table, _ in rows] == ['sources'] + ['documents'] * 10 + ['code_examples']
+    assert rows[-1][1]['code'] == 'print(1)' and rows[-1][1]['source_url'] == 'https://example.com'
+    assert sorted(row['id'] for table, row in rows if table == 'documents') == sorted(vectors)
+    for doc_id, vec in vectors.items():
+        np.testing.assert_array_equal(np.load(tmp_path / "vectors" / f"{doc_id}.npy"), vec)
+
+
+def test_get_documents_by_ids_keeps_order_and_skips_missing(db_path):
+    with DevDiggerDB(db_path, read_only=True) as db:
+        rows = db.get_documents_by_ids(['doc7', 'missing', 'doc2', 'doc0'])
+        assert [row['id'] for row in rows] == ['doc7', 'doc2', 'doc0']
+        assert db.get_documents_by_ids([]) == []
+        assert db.get_documents_by_ids(iter(['doc3']), as_dict=True)[0]['content'] == 'word3 text'
+
+
+def test_get_stats_approximate(db_path):
+    exact = {'sources': 1, 'documents': 10, 'code_examples': 0, 'collections': 0}
+    with DevDiggerDB(db_path) as db:
+        # No sqlite_stat1 yet, so the counts are exact
+        assert db.get_stats(approximate=True) == exact
+
+        db.conn.execute("INSERT INTO collections (id, name) VALUES ('c1', 'docs')")
+        db.conn.execute("""
+            INSERT INTO code_examples (id, document_id, source_id, code)
+            VALUES ('e1', 'doc1', 's1', 'print(1)')
+        """)
+        db.conn.execute("ANALYZE")
+        add_document(db.conn, "late", "late text")
+        db.conn.commit()
+
+        assert db.get_stats() == {**exact, 'documents': 11, 'code_examples': 1, 'collections': 1}
+        # Estimates are as of the ANALYZE
+        assert db.get_stats(approximate=True) == {**exact, 'code_examples': 1, 'collections': 1}
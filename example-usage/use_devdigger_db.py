@@ -13,58 +13,566 @@ This script shows how to:
 import sqlite3
 import json
 import os
+import struct
+import uuid
+from itertools import islice
 from pathlib import Path
 import numpy as np
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # Path to DevDigger database
 DB_PATH = Path.home() / "Library" / "Application Support" / "devdigger" / "devdigger.db"
 
+# int8 quantization parameters for the embedding_int8 column
+QUANT_POWER = 2
+QUANT_SCALE = 127.5
+
+# Layout of <db>.embeddings.f32: a fixed header (magic, dimension, file id)
+# followed by one float32 vector per slot. The file id must match the
+# settings row below, which ties the file to the database that wrote it.
+EMBEDDING_FILE_MAGIC = b'DDEMBF32'
+EMBEDDING_FILE_HEADER = '<8sI32s'
+EMBEDDING_FILE_HEADER_SIZE = 64
+EMBEDDING_FILE_SETTING = 'python_embeddings_file_id'
+# Rewrite the file once more than half of at least this many slots are dead
+EMBEDDING_FILE_COMPACT_MIN_SLOTS = 1024
+
+# Settings row holding the stamp of the documents a saved FAISS index covers
+FAISS_INDEX_SETTING = 'python_faiss_index_stamp'
+
+# Queries streamed by the exporters; embedding blobs are left out
+EXPORT_QUERIES = {
+    'sources': """
+        SELECT id, type, url, title, crawl_status, created_at
+        FROM sources
+        ORDER BY created_at DESC
+    """,
+    'documents': """
+        SELECT id, source_id, content, content_hash, chunk_index, metadata,
+               embedding_model, created_at
+        FROM documents
+    """,
+    'code_examples': """
+        SELECT c.*, s.url as source_url
+        FROM code_examples c
+        JOIN sources s ON c.source_id = s.id
+    """,
+}
+
+
+def _dumps(obj):
+    """Serialize to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=str).encode()
+
+
+def iter_export(path):
+    """Read a JSON Lines export back as (table, row) pairs in constant memory"""
+    table = None
+    with open(path, 'rb') as f:
+        for line in f:
+            obj = orjson.loads(line) if orjson is not None else json.loads(line)
+            if obj.keys() == {'table'}:
+                table = obj['table']
+            else:
+                yield table, obj
+
+
+def quantize_embedding(x, power=QUANT_POWER, scale=QUANT_SCALE):
+    """Quantize a float vector to an int8 blob using a power/scale curve"""
+    x = np.asarray(x, dtype=np.float32)
+    sat = np.sign(x) * np.abs(x) ** (1 / power)
+    return np.clip(np.round(sat * scale), -127, 127).astype(np.int8).tobytes()
+
+
+def dequantize_embedding(q, power=QUANT_POWER, scale=QUANT_SCALE):
+    """Recover an approximate float32 vector from an int8 blob or array"""
+    if isinstance(q, (bytes, memoryview)):
+        q = np.frombuffer(q, dtype=np.int8)
+    y = q.astype(np.float32) / scale
+    return np.sign(y) * np.abs(y) ** power
+
+
+def binarize_embedding(x):
+    """Pack the sign bit of each dimension into a bytes blob (D/8 bytes)"""
+    return np.packbits(np.asarray(x) > 0).tobytes()
+
+
+def _row_norms(rows, matrix):
+    """The cached embedding_norm of each row, computed from matrix where missing"""
+    # Rows written since the last writable open have no cached norm yet
+    norms = np.array([np.nan if row['embedding_norm'] is None else row['embedding_norm']
+                      for row in rows], dtype=np.float32)
+    missing = np.isnan(norms)
+    if missing.any():
+        norms[missing] = np.linalg.norm(matrix[missing].astype(np.float32), axis=1)
+    return norms
+
+
+def _as_words(bits):
+    """View an (N, bytes) uint8 bit matrix as (N, words) uint64, zero-padded"""
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def _popcount(words):
+    """Count set bits per row of a uint64 matrix"""
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0, maps to POPCNT
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_kernel(matrix, q, q_norm, norms, k, n_chunks):
+        """Fused dot product, cosine normalization and per-chunk top-k"""
+        n, dim = matrix.shape
+        chunk = (n + n_chunks - 1) // n_chunks
+        # Cosine scores are >= -1, so -3 marks an empty slot
+        part_scores = np.full((n_chunks, k), -3.0, dtype=np.float32)
+        part_idx = np.full((n_chunks, k), -1, dtype=np.int64)
+        
+        for c in prange(n_chunks):
+            for i in range(c * chunk, min(n, (c + 1) * chunk)):
+                dot = 0.0
+                for j in range(dim):
+                    dot += matrix[i, j] * q[j]
+                denom = norms[i] * q_norm
+                score = dot / denom if denom > 0 else 0.0
+                
+                # Insertion into this chunk's sorted top-k
+                if score > part_scores[c, k - 1]:
+                    pos = k - 1
+                    while pos > 0 and part_scores[c, pos - 1] < score:
+                        part_scores[c, pos] = part_scores[c, pos - 1]
+                        part_idx[c, pos] = part_idx[c, pos - 1]
+                        pos -= 1
+                    part_scores[c, pos] = score
+                    part_idx[c, pos] = i
+        return part_scores.ravel(), part_idx.ravel()
+
+
+def _topk_batch(matrix, q, norms, k):
+    """Return (row indices, scores) of the k best cosine matches in a batch"""
+    # The kernel does no bounds checking, so a short query would read garbage
+    if q.shape != (matrix.shape[1],):
+        raise ValueError(
+            f"query has dimension {q.shape[0]}, embeddings have {matrix.shape[1]}"
+        )
+    k = min(k, len(matrix))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    q_norm = np.float32(np.linalg.norm(q))
+    if njit is not None:
+        n_chunks = max(1, min(64, len(matrix) // 256))
+        scores, idx = _topk_kernel(matrix, q, q_norm, norms, k, n_chunks)
+        found = idx >= 0
+        scores, idx = scores[found], idx[found]
+    else:
+        scores = (matrix @ q) / np.where(norms == 0, 1, norms) / (q_norm or 1)
+        idx = np.arange(len(matrix))
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k)[:k]
+        scores, idx = scores[keep], idx[keep]
+    return idx, scores
+
+
 class DevDiggerDB:
     """Interface to DevDigger knowledge database"""
     
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, read_only=False):
+        """Open the database
+        
+        read_only=True opens it with mode=ro so several processes can share it
+        through the OS page cache. It skips the schema setup below, so the
+        database must have been opened writable at least once before.
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(str(db_path))
+        self.read_only = read_only
+        if read_only:
+            uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+        else:
+            self.conn = sqlite3.connect(str(db_path))
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
+        self._faiss_index = None
+        self._faiss_ids = None
         
-    def get_stats(self):
-        """Get database statistics"""
-        stats = {}
-        tables = ['sources', 'documents', 'code_examples', 'collections']
+        # Read-heavy tuning: memory-mapped reads, 256 MB page cache
+        if read_only:
+            self.conn.execute("PRAGMA query_only = ON")
+        else:
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA mmap_size = 1073741824")
+        self.conn.execute("PRAGMA cache_size = -262144")
         
-        for table in tables:
-            self.cursor.execute(f"SELECT COUNT(*) as count FROM {table}")
-            stats[table] = self.cursor.fetchone()['count']
+        # Hot-path SQL is kept as fixed text so sqlite3's per-connection
+        # statement cache hands back the compiled statement on every call
+        self._stmt_search = """
+            SELECT 
+                d.id,
+                d.content,
+                d.source_id,
+                s.url,
+                s.title,
+                MIN(f.rank) AS rank
+            FROM documents_fts f
+            JOIN documents d ON d.id = f.id
+            JOIN sources s ON d.source_id = s.id
+            WHERE documents_fts MATCH ?
+            GROUP BY d.id
+            ORDER BY rank
+            LIMIT ?
+        """
+        self._stmt_documents_by_ids = """
+            SELECT d.*
+            FROM json_each(?) ids
+            JOIN documents d ON d.id = ids.value
+            ORDER BY ids.key
+        """
+        
+        if not read_only:
+            self._ensure_indexes()
+            self._ensure_fts()
+            self._ensure_embedding_sidecars()
+            self._ensure_embedding_file()
+    
+    def _add_column(self, table, column, decl):
+        """Add a column to an app-owned table if it isn't there yet"""
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row['name'] for row in self.cursor.fetchall()}:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    
+    def _ensure_indexes(self):
+        """Create the indexes the query methods below rely on"""
+        # Each index costs disk space and a little ingestion time in the app.
+        # (source_id, chunk_index) lets get_documents(source_id) walk the
+        # index in order instead of sorting. The code_examples names match
+        # the app's, so these are no-ops on databases it has initialized.
+        self.cursor.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_documents_source_chunk ON documents(source_id, chunk_index);
+            CREATE INDEX IF NOT EXISTS idx_code_examples_source_id ON code_examples(source_id);
+            CREATE INDEX IF NOT EXISTS idx_code_examples_language ON code_examples(language);
+        """)
+    
+    def _ensure_embedding_sidecars(self, batch_size=1000):
+        """Backfill the per-document values derived from the stored embedding"""
+        # The app keeps writing float32 into `embedding` (its cosine_similarity
+        # reads it), so the int8 copy, the sign-bit copy, the cached norm and
+        # the slot in embeddings.f32 get their own columns.
+        self._add_column('documents', 'embedding_int8', 'BLOB')
+        self._add_column('documents', 'embedding_binary', 'BLOB')
+        self._add_column('documents', 'embedding_norm', 'REAL')
+        self._add_column('documents', 'embedding_offset', 'INTEGER')
+        self.cursor.executescript("""
+            DROP TRIGGER IF EXISTS documents_embedding_au;
+            CREATE TRIGGER documents_embedding_au
+            AFTER UPDATE OF embedding ON documents BEGIN
+                UPDATE documents
+                SET embedding_int8 = NULL, embedding_binary = NULL, embedding_norm = NULL,
+                    embedding_offset = NULL
+                WHERE id = new.id;
+            END;
+        """)
+        
+        with self.conn:
+            while True:
+                rows = self.conn.execute("""
+                    SELECT id, embedding FROM documents
+                    WHERE embedding IS NOT NULL
+                      AND (embedding_int8 IS NULL OR embedding_binary IS NULL
+                           OR embedding_norm IS NULL)
+                    LIMIT ?
+                """, (batch_size,)).fetchall()
+                if not rows:
+                    break
+                
+                updates = []
+                for row in rows:
+                    vec = np.frombuffer(row['embedding'], dtype=np.float32)
+                    updates.append((
+                        quantize_embedding(vec),
+                        binarize_embedding(vec),
+                        float(np.linalg.norm(vec)),
+                        row['id']
+                    ))
+                self.conn.executemany("""
+                    UPDATE documents
+                    SET embedding_int8 = ?, embedding_binary = ?, embedding_norm = ?
+                    WHERE id = ?
+                """, updates)
+    
+    def _embeddings_path(self):
+        """Where the contiguous float32 copy of the embeddings is kept"""
+        return Path(self.db_path).with_suffix('.embeddings.f32')
+    
+    def _setting(self, key):
+        """Read a value from the app's settings table, or None if it isn't set"""
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'settings'")
+        if not self.cursor.fetchone():
+            return None
+        self.cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def _set_setting(self, key, value):
+        """Write a value to the app's settings table, creating it if needed"""
+        # Same schema as DatabaseService.createTables()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.execute("""
+            INSERT OR REPLACE INTO settings (key, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        """, (key, value))
+    
+    def _embedding_file_id(self):
+        """The file id this database expects in its embeddings file header"""
+        return self._setting(EMBEDDING_FILE_SETTING)
+    
+    def _embedding_file(self):
+        """(dim, slots) of this database's embeddings file, or None if there is none
+        
+        A file whose header doesn't carry this database's file id (a copy
+        left by another database, or one interrupted mid-rewrite) is ignored.
+        """
+        path = self._embeddings_path()
+        file_id = self._embedding_file_id()
+        if file_id is None or not path.exists():
+            return None
+        with open(path, 'rb') as f:
+            header = f.read(EMBEDDING_FILE_HEADER_SIZE)
+        if len(header) < EMBEDDING_FILE_HEADER_SIZE:
+            return None
+        magic, dim, stored_id = struct.unpack_from(EMBEDDING_FILE_HEADER, header)
+        if magic != EMBEDDING_FILE_MAGIC or stored_id.decode() != file_id or dim == 0:
+            return None
+        slots = (path.stat().st_size - EMBEDDING_FILE_HEADER_SIZE) // (dim * 4)
+        return dim, slots
+    
+    def _dominant_embedding_dim(self):
+        """The dimension most stored embeddings have, or None if there are none"""
+        # The app stores vectors from several models, so dimensions can differ
+        self.cursor.execute("""
+            SELECT length(embedding) / 4 FROM documents
+            WHERE embedding IS NOT NULL
+            GROUP BY 1 ORDER BY COUNT(*) DESC
+            LIMIT 1
+        """)
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def _ensure_embedding_file(self, batch_size=1000):
+        """Append embeddings missing from the embeddings file and record their slots"""
+        # embedding_offset is a row slot: the vector starts at byte
+        # header + offset * D * 4. Slots of re-embedded or deleted documents
+        # are left behind until most of the file is dead, then it is
+        # rewritten; vectors whose dimension doesn't match the file get -1.
+        # The index covers everything iter_embedding_batches reads per row,
+        # so a scan never touches the table pages holding the BLOBs.
+        self.cursor.executescript("""
+            DROP INDEX IF EXISTS idx_documents_embedding_offset;
+            CREATE INDEX IF NOT EXISTS idx_documents_embedding_slots
+                ON documents(embedding_offset, embedding_norm, id);
+        """)
+        path = self._embeddings_path()
+        dim, slots = self._embedding_file() or (None, 0)
+        if dim is not None:
+            self.cursor.execute("""
+                SELECT MAX(embedding_offset), COUNT(embedding_offset) FROM documents
+                WHERE embedding_offset >= 0
+            """)
+            max_offset, live = self.cursor.fetchone()
+            truncated = max_offset is not None and max_offset >= slots
+            mostly_dead = slots >= EMBEDDING_FILE_COMPACT_MIN_SLOTS and live * 2 < slots
+            if truncated or mostly_dead:
+                dim = None
+        
+        if dim is None:
+            # Start a fresh file under a new id, so a crash midway leaves a
+            # file that no longer matches rather than one that lies
+            dim = self._dominant_embedding_dim()
+            if dim is None:
+                return
+            file_id = uuid.uuid4().hex
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE documents SET embedding_offset = NULL WHERE embedding_offset IS NOT NULL"
+                )
+                self._set_setting(EMBEDDING_FILE_SETTING, file_id)
+            with open(path, 'wb') as f:
+                header = struct.pack(EMBEDDING_FILE_HEADER, EMBEDDING_FILE_MAGIC, dim, file_id.encode())
+                f.write(header.ljust(EMBEDDING_FILE_HEADER_SIZE, b'\0'))
+            slots = 0
+        
+        with open(path, 'r+b') as f:
+            f.truncate(EMBEDDING_FILE_HEADER_SIZE + slots * dim * 4)
+            f.seek(0, os.SEEK_END)
+            with self.conn:
+                while True:
+                    rows = self.conn.execute("""
+                        SELECT id, embedding FROM documents
+                        WHERE embedding IS NOT NULL AND embedding_offset IS NULL
+                        LIMIT ?
+                    """, (batch_size,)).fetchall()
+                    if not rows:
+                        break
+                    
+                    updates = []
+                    for row in rows:
+                        if len(row['embedding']) != dim * 4:
+                            updates.append((-1, row['id']))
+                            continue
+                        f.write(row['embedding'])
+                        updates.append((slots, row['id']))
+                        slots += 1
+                    self.conn.executemany(
+                        "UPDATE documents SET embedding_offset = ? WHERE id = ?", updates
+                    )
+                # Vectors must be on disk before the offsets pointing at them commit
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _ensure_fts(self):
+        """Create the FTS5 index over documents and fill in what the app missed"""
+        # Same layout the app's enhanced search service uses, so both share one
+        # index. The app writes FTS rows itself (addDocumentWithFTS, its
+        # initializeFTS fill and rebuildFTSIndex), all with fresh rowids, so
+        # rows are matched to documents by the id column, never by rowid.
+        self.cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                id UNINDEXED,
+                content,
+                title,
+                url,
+                tokenize='porter unicode61'
+            )
+        """)
+        self.cursor.executescript("""
+            BEGIN;
+            DROP TRIGGER IF EXISTS documents_ai;
+            DROP TRIGGER IF EXISTS documents_ad;
+            DROP TRIGGER IF EXISTS documents_au;
+            
+            -- Index documents as they are inserted, so read-only instances can
+            -- find them. addDocumentWithFTS then adds a second row for the
+            -- same id; search() collapses those and the next writable open
+            -- removes them. A NOT EXISTS guard would full-scan the index on
+            -- every insert, since id is UNINDEXED.
+            CREATE TRIGGER documents_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (id, content, title, url) VALUES (
+                    new.id,
+                    new.content,
+                    COALESCE((SELECT title FROM sources WHERE id = new.source_id), ''),
+                    COALESCE((SELECT url FROM sources WHERE id = new.source_id), '')
+                );
+            END;
             
-        return stats
+            -- The app's initializeFTS fill can index a document more than once
+            DELETE FROM documents_fts
+            WHERE rowid NOT IN (SELECT MIN(rowid) FROM documents_fts GROUP BY id);
+            DELETE FROM documents_fts WHERE id NOT IN (SELECT id FROM documents);
+            
+            -- Documents added before the trigger above existed
+            INSERT INTO documents_fts (id, content, title, url)
+                SELECT d.id, d.content, COALESCE(s.title, ''), COALESCE(s.url, '')
+                FROM documents d
+                LEFT JOIN sources s ON d.source_id = s.id
+                WHERE d.id NOT IN (SELECT id FROM documents_fts);
+            COMMIT;
+        """)
+    
+    @staticmethod
+    def _fts_query(query):
+        """Quote each bare term so user input can't trip FTS5 query syntax
+        
+        The terms are restricted to the content column; title and url are
+        indexed too but aren't part of a document's text.
+        """
+        terms = query.split()
+        if not terms:
+            return ""
+        return "content : (" + " ".join('"' + term.replace('"', '""') + '"' for term in terms) + ")"
+        
+    @staticmethod
+    def _rows(cursor, as_dict):
+        """Fetch all rows, as sqlite3.Row (dict-like, read-only) unless as_dict"""
+        if as_dict:
+            return [dict(row) for row in cursor.fetchall()]
+        return cursor.fetchall()
+    
+    def get_stats(self, approximate=False):
+        """Get database statistics in a single query
+        
+        With approximate=True, the row counts ANALYZE / PRAGMA optimize
+        recorded in sqlite_stat1 are returned instead when all four tables
+        have one, which avoids counting large tables.
+        """
+        tables = ['sources', 'documents', 'code_examples', 'collections']
+        
+        if approximate:
+            self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if self.cursor.fetchone():
+                self.cursor.execute("""
+                    SELECT tbl, MAX(CAST(stat AS INTEGER))
+                    FROM sqlite_stat1
+                    WHERE tbl IN ('sources', 'documents', 'code_examples', 'collections')
+                    GROUP BY tbl
+                """)
+                estimates = dict(self.cursor.fetchall())
+                if len(estimates) == len(tables):
+                    return {table: estimates[table] for table in tables}
+        
+        self.cursor.execute("""
+            SELECT 'sources', COUNT(*) FROM sources
+            UNION ALL SELECT 'documents', COUNT(*) FROM documents
+            UNION ALL SELECT 'code_examples', COUNT(*) FROM code_examples
+            UNION ALL SELECT 'collections', COUNT(*) FROM collections
+        """)
+        return dict(self.cursor.fetchall())
     
-    def list_sources(self):
+    def list_sources(self, as_dict=False):
         """List all crawled sources"""
         self.cursor.execute("""
             SELECT id, type, url, title, crawl_status, created_at
             FROM sources
             ORDER BY created_at DESC
         """)
-        return [dict(row) for row in self.cursor.fetchall()]
+        return self._rows(self.cursor, as_dict)
     
-    def search(self, query, limit=10):
-        """Full-text search across documents"""
-        self.cursor.execute("""
-            SELECT 
-                d.id,
-                d.content,
-                d.source_id,
-                s.url,
-                s.title
-            FROM documents d
-            JOIN sources s ON d.source_id = s.id
-            WHERE d.content LIKE ?
-            LIMIT ?
-        """, (f"%{query}%", limit))
-        return [dict(row) for row in self.cursor.fetchall()]
+    def search(self, query, limit=10, as_dict=False):
+        """Full-text search across documents, ranked by BM25
+        
+        Documents the app inserts are indexed by a trigger the first
+        writable open installs, so read-only instances find them too.
+        """
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        
+        cursor = self.conn.execute(self._stmt_search, (fts_query, limit))
+        return self._rows(cursor, as_dict)
     
-    def get_documents(self, source_id=None):
+    def get_documents(self, source_id=None, as_dict=False):
         """Get all documents, optionally filtered by source"""
         if source_id:
             self.cursor.execute("""
@@ -74,9 +582,14 @@ class DevDiggerDB:
             """, (source_id,))
         else:
             self.cursor.execute("SELECT * FROM documents")
-        return [dict(row) for row in self.cursor.fetchall()]
+        return self._rows(self.cursor, as_dict)
+    
+    def get_documents_by_ids(self, ids, as_dict=False):
+        """Get documents by id in a single query, in the order given"""
+        cursor = self.conn.execute(self._stmt_documents_by_ids, (json.dumps(list(ids)),))
+        return self._rows(cursor, as_dict)
     
-    def get_code_examples(self, language=None):
+    def get_code_examples(self, language=None, as_dict=False):
         """Get code examples, optionally filtered by language"""
         if language:
             self.cursor.execute("""
@@ -91,20 +604,27 @@ class DevDiggerDB:
                 FROM code_examples c
                 JOIN sources s ON c.source_id = s.id
             """)
-        return [dict(row) for row in self.cursor.fetchall()]
+        return self._rows(self.cursor, as_dict)
     
-    def get_embeddings(self):
-        """Get documents with embeddings for vector search"""
-        self.cursor.execute("""
+    def get_embeddings(self, quantized=False):
+        """Get documents with embeddings for vector search
+        
+        With quantized=True the int8 copies are returned (4x less data to
+        read); pass them to dequantize_embedding if float32 is needed.
+        embedding_norm is the L2 norm of the original float32 vector.
+        """
+        column, dtype = ('embedding_int8', np.int8) if quantized else ('embedding', np.float32)
+        self.cursor.execute(f"""
             SELECT 
                 d.id,
                 d.content,
-                d.embedding,
+                d.{column} AS embedding,
+                d.embedding_norm,
                 s.url,
                 s.title
             FROM documents d
             JOIN sources s ON d.source_id = s.id
-            WHERE d.embedding IS NOT NULL
+            WHERE d.{column} IS NOT NULL
         """)
         
         results = []
@@ -112,46 +632,420 @@ class DevDiggerDB:
             doc = dict(row)
             # Convert embedding from blob to numpy array
             if doc['embedding']:
-                doc['embedding'] = np.frombuffer(doc['embedding'], dtype=np.float32)
+                doc['embedding'] = np.frombuffer(doc['embedding'], dtype=dtype)
             results.append(doc)
         return results
     
+    def iter_embedding_batches(self, batch_size=4096, dtype=np.float32, dim=None):
+        """Yield (ids, matrix, norms) batches of embeddings stacked into one array
+        
+        Each matrix is a contiguous (n, D) array, so callers can score a
+        whole batch with a single matrix product instead of a Python loop.
+        norms holds the cached L2 norm of each row. Only embeddings of
+        dimension dim are yielded (by default the most common one). Matrices
+        are read-only views into the memory-mapped embeddings file where
+        possible, in file order so a full scan reads it sequentially;
+        documents the file doesn't cover yet are read from their BLOBs.
+        
+        dtype may be any float dtype, or np.int8 to get the embedding_int8
+        copies (see quantize_embedding); norms are always those of the
+        float32 vectors.
+        """
+        dtype = np.dtype(dtype)
+        if dtype != np.int8 and not np.issubdtype(dtype, np.floating):
+            raise ValueError(f"dtype must be a float dtype or int8, not {dtype}")
+        if dim is None:
+            dim = self._dominant_embedding_dim()
+            if dim is None:
+                return
+        if dtype == np.int8:
+            yield from self._iter_int8_batches(batch_size, dim)
+            return
+        info = self._embedding_file()
+        if info is None or info[0] != dim or info[1] == 0:
+            yield from self._iter_blob_batches(batch_size, dtype, dim)
+            return
+        
+        slots = info[1]
+        mm = np.memmap(self._embeddings_path(), dtype=np.float32, mode='r',
+                       offset=EMBEDDING_FILE_HEADER_SIZE, shape=(slots, dim))
+        # Answered from idx_documents_embedding_slots alone; plain tuples
+        # skip building a sqlite3.Row per document
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("""
+            SELECT embedding_offset, embedding_norm, id FROM documents
+            WHERE embedding_offset BETWEEN 0 AND ?
+            ORDER BY embedding_offset
+        """, (slots - 1,))
+        while rows := cursor.fetchmany(batch_size):
+            offsets, norms, ids = zip(*rows)
+            offsets = np.array(offsets, dtype=np.int64)
+            if offsets[-1] - offsets[0] == len(offsets) - 1:
+                matrix = mm[offsets[0]:offsets[-1] + 1]
+            else:
+                matrix = mm[offsets]
+            if matrix.dtype != dtype:
+                matrix = matrix.astype(dtype)
+            yield np.array(ids), matrix, np.array(norms, dtype=np.float32)
+        
+        # Documents added or re-embedded since the last writable open
+        yield from self._iter_blob_batches(batch_size, dtype, dim, mapped_slots=slots)
+    
+    def _iter_blob_batches(self, batch_size, dtype, dim, mapped_slots=0):
+        """iter_embedding_batches() from the BLOB column, skipping rows in the
+        first mapped_slots slots of the embeddings file"""
+        if mapped_slots:
+            # Unmapped rows sort first in idx_documents_embedding_slots, so
+            # this doesn't scan the whole table
+            cursor = self.conn.execute("""
+                SELECT id, embedding, embedding_norm FROM documents
+                WHERE (embedding_offset IS NULL OR embedding_offset >= ?)
+                  AND embedding IS NOT NULL AND length(embedding) = ?
+            """, (mapped_slots, dim * 4))
+        else:
+            cursor = self.conn.execute("""
+                SELECT id, embedding, embedding_norm FROM documents
+                WHERE embedding IS NOT NULL AND length(embedding) = ?
+            """, (dim * 4,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            
+            # A fresh buffer per batch, so callers may hold on to it
+            out = np.empty((len(rows), dim), dtype=dtype)
+            for i, row in enumerate(rows):
+                out[i] = np.frombuffer(row['embedding'], dtype=np.float32)
+            yield np.array([row['id'] for row in rows]), out, _row_norms(rows, out)
+    
+    def _iter_int8_batches(self, batch_size, dim):
+        """iter_embedding_batches() from the embedding_int8 column; rows not
+        backfilled yet are quantized from their float32 BLOB"""
+        cursor = self.conn.execute("""
+            SELECT id, embedding_int8, embedding_norm,
+                   CASE WHEN embedding_int8 IS NULL OR embedding_norm IS NULL
+                        THEN embedding END AS embedding
+            FROM documents
+            WHERE embedding IS NOT NULL AND length(embedding) = ?
+        """, (dim * 4,))
+        while rows := cursor.fetchmany(batch_size):
+            out = np.empty((len(rows), dim), dtype=np.int8)
+            norms = np.empty(len(rows), dtype=np.float32)
+            for i, row in enumerate(rows):
+                if row['embedding'] is None:
+                    out[i] = np.frombuffer(row['embedding_int8'], dtype=np.int8)
+                    norms[i] = row['embedding_norm']
+                    continue
+                vec = np.frombuffer(row['embedding'], dtype=np.float32)
+                out[i] = np.frombuffer(row['embedding_int8'] or quantize_embedding(vec), dtype=np.int8)
+                norms[i] = np.linalg.norm(vec) if row['embedding_norm'] is None else row['embedding_norm']
+            yield np.array([row['id'] for row in rows]), out, norms
+    
+    def similarity_search(self, query_vec, top_k=10, batch_size=4096):
+        """Cosine-similarity search over stored embeddings
+        
+        Only embeddings with the query's dimension are searched. Each batch
+        is reduced to its own top-k by a Numba kernel when numba is
+        installed, otherwise with NumPy. Returns (ids, scores) arrays, best
+        match first.
+        """
+        q = np.asarray(query_vec, dtype=np.float32)
+        best_ids = np.empty(0, dtype=object)
+        best_scores = np.empty(0, dtype=np.float32)
+        
+        for ids, matrix, norms in self.iter_embedding_batches(batch_size, dim=len(q)):
+            idx, scores = _topk_batch(matrix, q, norms, top_k)
+            
+            # Merge this batch into the running top-k
+            best_ids = np.concatenate([best_ids, ids[idx].astype(object)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(-best_scores, top_k)[:top_k]
+                best_ids, best_scores = best_ids[keep], best_scores[keep]
+        
+        order = np.argsort(-best_scores)
+        return best_ids[order], best_scores[order]
+    
+    def binary_search(self, query_vec, top_k=10, rerank_k=None):
+        """Hamming-distance shortlist over sign bits, reranked by cosine
+        
+        The packed sign bits are 32x smaller than float32, so the first pass
+        is cheap; only the rerank_k closest candidates (10 * top_k by
+        default) are scored with their full float32 vectors. Only documents
+        whose embedding has the query's dimension are searched; those added
+        since the last writable open are binarized on the fly. Returns
+        (ids, scores) arrays, best match first.
+        """
+        rerank_k = rerank_k or 10 * top_k
+        q = np.asarray(query_vec, dtype=np.float32)
+        q_bits = binarize_embedding(q)
+        rows = self.conn.execute("""
+            SELECT id, embedding_binary,
+                   CASE WHEN embedding_binary IS NULL THEN embedding END AS embedding
+            FROM documents
+            WHERE length(embedding) = ?
+              AND (embedding_binary IS NULL OR length(embedding_binary) = ?)
+        """, (4 * len(q), len(q_bits))).fetchall()
+        if not rows:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+        
+        ids = np.array([row['id'] for row in rows], dtype=object)
+        bits = np.frombuffer(b''.join(
+            row['embedding_binary']
+            or binarize_embedding(np.frombuffer(row['embedding'], dtype=np.float32))
+            for row in rows
+        ), dtype=np.uint8)
+        matrix = _as_words(bits.reshape(len(rows), -1))
+        q_words = _as_words(np.frombuffer(q_bits, dtype=np.uint8)[None, :])
+        
+        distances = _popcount(matrix ^ q_words)
+        if len(distances) > rerank_k:
+            candidates = ids[np.argpartition(distances, rerank_k)[:rerank_k]]
+        else:
+            candidates = ids
+        
+        rows = self.conn.execute("""
+            SELECT d.id, d.embedding, d.embedding_norm
+            FROM json_each(?) ids
+            JOIN documents d ON d.id = ids.value
+            WHERE length(d.embedding) = ?
+        """, (json.dumps(candidates.tolist()), 4 * len(q))).fetchall()
+        if not rows:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if q_norm > 0:
+            q = q / q_norm
+        matrix = np.stack([np.frombuffer(row['embedding'], dtype=np.float32) for row in rows])
+        norms = _row_norms(rows, matrix)
+        scores = (matrix @ q) / np.where(norms == 0, 1, norms)
+        
+        order = np.argsort(-scores)[:top_k]
+        return np.array([row['id'] for row in rows], dtype=object)[order], scores[order]
+    
+    def build_faiss_index(self, quantized=True, batch_size=4096):
+        """Build a FAISS inner-product index over the normalized embeddings
+        
+        quantized=True stores 8-bit scalar-quantized vectors (trained on the
+        first batch), otherwise full float32 in an IndexFlatIP. The index is
+        written next to the database as devdigger.faiss, with the matching
+        document ids in devdigger.faiss.ids.npy and a stamp of the documents
+        it covers in the settings table. A read_only instance keeps the
+        index in memory only.
+        """
+        try:
+            import faiss
+        except ImportError:
+            print("Install faiss: pip install faiss-cpu")
+            return None
+        
+        # Taken before reading, so documents embedded meanwhile make it stale
+        stamp = self._faiss_stamp()
+        index = None
+        all_ids = []
+        for ids, matrix, norms in self.iter_embedding_batches(batch_size):
+            matrix = np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms)[:, None])
+            if index is None:
+                dim = matrix.shape[1]
+                if quantized:
+                    index = faiss.IndexScalarQuantizer(
+                        dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+                    )
+                    index.train(matrix)
+                else:
+                    index = faiss.IndexFlatIP(dim)
+            index.add(matrix)
+            all_ids.append(ids)
+        if index is None:
+            return None
+        
+        self._faiss_ids = np.concatenate(all_ids).astype(object)
+        self._faiss_index = index
+        if not self.read_only:
+            index_path = self._faiss_path()
+            faiss.write_index(index, str(index_path))
+            np.save(index_path.with_suffix('.faiss.ids.npy'), self._faiss_ids.astype(str))
+            # Stamped only once both files are complete
+            with self.conn:
+                self._set_setting(FAISS_INDEX_SETTING, stamp)
+        return index
+    
+    def _faiss_path(self):
+        """Where the FAISS index for this database is saved"""
+        return Path(self.db_path).with_suffix('.faiss')
+    
+    def _faiss_stamp(self):
+        """Summarize the embedded documents a saved FAISS index was built from
+        
+        Adding or deleting a document changes the count and rowid total,
+        the app's INSERT OR REPLACE gives a document a new rowid, and
+        re-embedding one clears (then reassigns) its embedding_offset.
+        """
+        self.cursor.execute("""
+            SELECT COUNT(*), TOTAL(rowid), TOTAL(COALESCE(embedding_offset, -2))
+            FROM documents
+            WHERE embedding IS NOT NULL
+        """)
+        counts = self.cursor.fetchone()
+        return json.dumps([self._embedding_file_id(), *counts])
+    
+    def _load_faiss_index(self):
+        """Return the session's FAISS index, memory-mapping a saved one if it is current"""
+        if self._faiss_index is not None:
+            return self._faiss_index
+        
+        index_path = self._faiss_path()
+        ids_path = index_path.with_suffix('.faiss.ids.npy')
+        if not (index_path.exists() and ids_path.exists()) or (
+            self._setting(FAISS_INDEX_SETTING) != self._faiss_stamp()
+        ):
+            return self.build_faiss_index()
+        try:
+            import faiss
+        except ImportError:
+            print("Install faiss: pip install faiss-cpu")
+            return None
+        self._faiss_index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP)
+        self._faiss_ids = np.load(ids_path).astype(object)
+        return self._faiss_index
+    
+    def semantic_search(self, query_vec, top_k=10):
+        """Cosine-similarity search through the FAISS index
+        
+        Loads the saved index on first use, or rebuilds it if documents were
+        added, deleted or re-embedded since it was saved. Within a session,
+        call build_faiss_index() again to pick up later changes. Returns
+        (ids, scores) arrays, best match first.
+        """
+        index = self._load_faiss_index()
+        if index is None:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+        
+        q = np.asarray(query_vec, dtype=np.float32)
+        if q.shape != (index.d,):
+            raise ValueError(f"query has dimension {q.shape[0]}, index has {index.d}")
+        q_norm = np.linalg.norm(q)
+        if q_norm > 0:
+            q = q / q_norm
+        scores, positions = index.search(q[None, :], top_k)
+        found = positions[0] >= 0
+        return self._faiss_ids[positions[0][found]], scores[0][found]
+    
     def export_to_json(self, output_path="devdigger_export.json"):
-        """Export entire database to JSON"""
-        data = {
-            'sources': self.list_sources(),
-            'documents': self.get_documents(),
-            'code_examples': self.get_code_examples()
-        }
+        """Export entire database to JSON, streaming one row at a time"""
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            f.write(b'{')
+            for t, (table, sql) in enumerate(EXPORT_QUERIES.items()):
+                if t:
+                    f.write(b',')
+                f.write(_dumps(table) + b':[')
+                for i, row in enumerate(self.conn.execute(sql)):
+                    if i:
+                        f.write(b',')
+                    f.write(_dumps(dict(row)))
+                f.write(b']')
+            f.write(b'}')
         
-        with open(output_path, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
+        return output_path
+    
+    def export_to_jsonl(self, output_path="devdigger_export.jsonl", embeddings_dir=None):
+        """Export entire database as JSON Lines, one row per line
+        
+        Each table section starts with a {"table": ...} header line. If
+        embeddings_dir is given, each document's embedding is written there
+        as <document_id>.npy.
+        """
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            for table, sql in EXPORT_QUERIES.items():
+                f.write(_dumps({'table': table}) + b'\n')
+                for row in self.conn.execute(sql):
+                    f.write(_dumps(dict(row)) + b'\n')
+        
+        if embeddings_dir is not None:
+            embeddings_dir = Path(embeddings_dir)
+            embeddings_dir.mkdir(parents=True, exist_ok=True)
+            for row in self.conn.execute(
+                "SELECT id, embedding FROM documents WHERE embedding IS NOT NULL"
+            ):
+                np.save(embeddings_dir / f"{row['id']}.npy",
+                        np.frombuffer(row['embedding'], dtype=np.float32))
         
         return output_path
     
-    def to_langchain_documents(self):
-        """Convert to LangChain Document format"""
+    def iter_langchain_documents(self):
+        """Yield documents one at a time in LangChain Document format"""
         try:
             from langchain.schema import Document
         except ImportError:
             print("Install langchain: pip install langchain")
-            return []
+            return
         
-        documents = []
-        for doc in self.get_documents():
-            documents.append(Document(
-                page_content=doc['content'],
+        for row in self.conn.execute("SELECT id, content, source_id, chunk_index FROM documents"):
+            yield Document(
+                page_content=row['content'],
                 metadata={
-                    'source_id': doc['source_id'],
-                    'chunk_index': doc['chunk_index'],
-                    'id': doc['id']
+                    'source_id': row['source_id'],
+                    'chunk_index': row['chunk_index'],
+                    'id': row['id']
                 }
-            ))
-        return documents
+            )
+    
+    def iter_langchain_documents_with_vectors(self, model=None, batch_size=1000):
+        """Yield (Document, embedding) pairs using the embeddings stored by the app
+        
+        Pass model (e.g. 'text-embedding-ada-002') to skip vectors produced by
+        a different embedding model than the one used for queries.
+        """
+        try:
+            from langchain.schema import Document
+        except ImportError:
+            print("Install langchain: pip install langchain")
+            return
+        
+        cursor = self.conn.execute("""
+            SELECT id, content, source_id, chunk_index, embedding
+            FROM documents
+            WHERE embedding IS NOT NULL AND (? IS NULL OR embedding_model = ?)
+        """, (model, model))
+        while rows := cursor.fetchmany(batch_size):
+            for row in rows:
+                yield Document(
+                    page_content=row['content'],
+                    metadata={
+                        'source_id': row['source_id'],
+                        'chunk_index': row['chunk_index'],
+                        'id': row['id']
+                    }
+                ), np.frombuffer(row['embedding'], dtype=np.float32)
+    
+    def to_langchain_documents(self):
+        """Convert to LangChain Document format"""
+        return list(self.iter_langchain_documents())
     
     def close(self):
-        """Close database connection"""
+        """Refresh query planner stats, checkpoint the WAL and close the connection
+        
+        Does nothing if the connection is already closed.
+        """
+        if self.conn is None:
+            return
+        if not self.read_only:
+            # Maintenance only: a busy database mustn't keep the connection
+            # open or mask the exception __exit__ is handling
+            try:
+                self.conn.execute("PRAGMA optimize")
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
         self.conn.close()
+        self.conn = None
+        self.cursor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 # ============================================
@@ -165,37 +1059,34 @@ def example_basic_usage():
     print("=" * 60)
     
     # Connect to database
-    db = DevDiggerDB()
-    
-    # Get statistics
-    stats = db.get_stats()
-    print(f"\n📊 Database Statistics:")
-    for table, count in stats.items():
-        print(f"  {table}: {count}")
-    
-    if stats['sources'] == 0:
-        print("\n⚠️  No data found! Please crawl some websites in DevDigger first.")
-        return
-    
-    # List sources
-    print(f"\n📚 Sources:")
-    for source in db.list_sources()[:5]:
-        print(f"  - {source['title'] or source['url']}")
-    
-    # Search for content
-    print(f"\n🔍 Searching for 'react':")
-    results = db.search("react", limit=3)
-    for i, result in enumerate(results, 1):
-        preview = result['content'][:100].replace('\n', ' ')
-        print(f"  {i}. {preview}...")
-    
-    # Get code examples
-    print(f"\n💻 Code Examples:")
-    examples = db.get_code_examples()[:3]
-    for example in examples:
-        print(f"  - {example['language']}: {example.get('description', 'No description')}")
-    
-    db.close()
+    with DevDiggerDB() as db:
+        # Get statistics
+        stats = db.get_stats()
+        print(f"\n📊 Database Statistics:")
+        for table, count in stats.items():
+            print(f"  {table}: {count}")
+        
+        if stats['sources'] == 0:
+            print("\n⚠️  No data found! Please crawl some websites in DevDigger first.")
+            return
+        
+        # List sources
+        print(f"\n📚 Sources:")
+        for source in db.list_sources()[:5]:
+            print(f"  - {source['title'] or source['url']}")
+        
+        # Search for content
+        print(f"\n🔍 Searching for 'react':")
+        results = db.search("react", limit=3)
+        for i, result in enumerate(results, 1):
+            preview = result['content'][:100].replace('\n', ' ')
+            print(f"  {i}. {preview}...")
+        
+        # Get code examples
+        print(f"\n💻 Code Examples:")
+        examples = db.get_code_examples()[:3]
+        for example in examples:
+            print(f"  - {example['language']}: {example['description'] or 'No description'}")
 
 
 def example_with_openai():
@@ -204,11 +1095,11 @@ def example_with_openai():
     
     # Initialize
     client = OpenAI()  # Uses OPENAI_API_KEY env var
-    db = DevDiggerDB()
     
     # Get relevant documents
     query = "How do React hooks work?"
-    docs = db.search(query, limit=5)
+    with DevDiggerDB() as db:
+        docs = db.search(query, limit=5)
     
     # Create context from documents
     context = "\n\n".join([doc['content'] for doc in docs])
@@ -223,7 +1114,6 @@ def example_with_openai():
     )
     
     print(f"Answer: {response.choices[0].message.content}")
-    db.close()
 
 
 def example_with_langchain():
@@ -233,13 +1123,19 @@ def example_with_langchain():
     from langchain.chains import RetrievalQA
     from langchain.llms import OpenAI
     
-    # Get documents from DevDigger
-    db = DevDiggerDB()
-    documents = db.to_langchain_documents()
-    
-    # Create vector store
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(documents, embeddings)
+    # Load the embeddings DevDigger already stored instead of re-embedding
+    # every chunk. OpenAIEmbeddings is then only called for the query, so
+    # only vectors from the same model are loaded.
+    vectorstore = Chroma(embedding_function=OpenAIEmbeddings())
+    with DevDiggerDB() as db:
+        pairs = db.iter_langchain_documents_with_vectors(model='text-embedding-ada-002')
+        while batch := list(islice(pairs, 1000)):
+            vectorstore._collection.add(
+                ids=[doc.metadata['id'] for doc, _ in batch],
+                embeddings=[vec.tolist() for _, vec in batch],
+                documents=[doc.page_content for doc, _ in batch],
+                metadatas=[doc.metadata for doc, _ in batch]
+            )
     
     # Create QA chain
     qa = RetrievalQA.from_chain_type(
@@ -251,8 +1147,6 @@ def example_with_langchain():
     # Ask questions
     result = qa.run("What is useState in React?")
     print(result)
-    
-    db.close()
 
 
 if __name__ == "__main__":